@@ -1,19 +1,144 @@
 import os
 import json
+import mmap
 import pickle
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 import pandas as pd
+import pyarrow
 from typing import Dict, Any, Optional
 import hashlib
-import pytz
+from functools import lru_cache
+import sqlite3
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import msgpack
+import orjson
+import zstandard
+
+
+# 缓存数据读取失败的标记（缓存的数据本身可能就是None）
+_MISSING = object()
+
+
+def _encode_pandas(obj):
+    """msgpack 无法直接序列化的对象（DataFrame/Series/Timestamp等）转换为可序列化的字典"""
+    if isinstance(obj, pd.DataFrame):
+        payload = obj.to_dict(orient='split')
+        return {
+            '__pd__': 'df',
+            'index': list(payload['index']),
+            'columns': list(payload['columns']),
+            'data': payload['data'],
+            'index_name': obj.index.name
+        }
+    if isinstance(obj, pd.Series):
+        return {
+            '__pd__': 'series',
+            'index': list(obj.index),
+            'data': obj.tolist(),
+            'name': obj.name,
+            'index_name': obj.index.name
+        }
+    if isinstance(obj, pd.Timestamp):
+        # 使用纳秒时间戳和时区名称，保证时区信息无损还原
+        return {'__pd__': 'ts', 'value': obj.value, 'tz': str(obj.tz) if obj.tz else None}
+    if isinstance(obj, datetime):
+        return {'__pd__': 'datetime', 'value': obj.isoformat()}
+    if hasattr(obj, 'item'):
+        # numpy标量
+        return obj.item()
+    raise TypeError(f"无法序列化的类型: {type(obj)}")
+
+
+def _decode_pandas(obj):
+    """msgpack 反序列化钩子，还原 _encode_pandas 编码的对象"""
+    kind = obj.get('__pd__')
+    if kind is None:
+        return obj
+    if kind == 'ts':
+        return pd.Timestamp(obj['value'], tz=obj['tz'])
+    if kind == 'datetime':
+        return datetime.fromisoformat(obj['value'])
+    if kind == 'df':
+        index = pd.Index(obj['index'], name=obj['index_name'])
+        return pd.DataFrame(obj['data'], index=index, columns=obj['columns'])
+    if kind == 'series':
+        index = pd.Index(obj['index'], name=obj['index_name'])
+        return pd.Series(obj['data'], index=index, name=obj['name'])
+    return obj
+
+
+def _is_filename_safe(value: str) -> bool:
+    """判断字符串是否可以直接用作文件名（仅包含ASCII字母、数字和下划线）"""
+    return value.isascii() and value.replace('_', '').isalnum()
+
+
+@lru_cache(maxsize=1024)
+def _simple_cache_key(ticker: str, data_type: str) -> str:
+    """生成不带额外参数的缓存键，可安全用作文件名时跳过MD5哈希"""
+    if _is_filename_safe(ticker) and _is_filename_safe(data_type):
+        return f"{ticker}_{data_type}"
+    return hashlib.md5(f"{ticker}_{data_type}".encode()).hexdigest()
+
+
+def _close_index(conn: sqlite3.Connection, lock: threading.Lock, access_log: Dict[str, str]) -> None:
+    """将内存中的最后访问时间写入索引并关闭数据库连接"""
+    with lock:
+        try:
+            _flush_access_log(conn, access_log)
+        finally:
+            conn.close()
+
+
+def _flush_access_log(conn: sqlite3.Connection, access_log: Dict[str, str]) -> None:
+    """将内存中的最后访问时间批量写入索引（调用方需持有锁）"""
+    if not access_log:
+        return
+    try:
+        with conn:
+            conn.executemany(
+                "UPDATE meta SET last_accessed = ? WHERE cache_key = ?",
+                [(last_accessed, cache_key) for cache_key, last_accessed in dict(access_log).items()]
+            )
+        access_log.clear()
+    except sqlite3.Error:
+        # 缓存目录已被删除等情况，放弃本次写入
+        pass
+
 
 class CacheManager:
-    def __init__(self, cache_dir="cache"):
+    # 可选的序列化方式
+    SERIALIZERS = ('msgpack', 'pickle')
+    
+    # 缓存文件格式对应的扩展名（DataFrame使用parquet，其他数据使用zstd压缩的msgpack）
+    SERIALIZER_EXTENSIONS = {
+        'parquet': '.parquet',
+        'msgpack_zstd': '.msgpack.zst',
+        'msgpack': '.msgpack',
+        'pickle_zstd': '.pkl.zst',
+        'pickle': '.pkl'
+    }
+    
+    # 缓存索引数据库文件名
+    INDEX_FILENAME = 'index.sqlite'
+    
+    # 清理时不删除最近修改过的未索引文件（可能是其他会话正在保存、尚未写入索引的缓存）
+    ORPHAN_GRACE_SECONDS = 60
+    
+    def __init__(self, cache_dir="cache", serializer="msgpack", compression_level=3):
+        if serializer not in self.SERIALIZERS:
+            raise ValueError(f"不支持的序列化方式: {serializer}")
         self.cache_dir = cache_dir
+        self.serializer = serializer
+        self.compression_level = compression_level  # zstd压缩级别，None表示不压缩
         self.ensure_cache_dir()
         
         # 美东时区
-        self.et_tz = pytz.timezone('US/Eastern')
+        self.et_tz = ZoneInfo('America/New_York')
         
         # 缓存过期时间设置 - 基于交易日
         self.cache_expiry = {
@@ -26,66 +151,325 @@ class CacheManager:
         
         # 数据未使用超过3个月自动删除
         self.unused_expiry = timedelta(days=90)
+        
+        # 最近交易日收盘时间缓存：(计算时的monotonic时间, 收盘时间epoch秒)
+        self._trading_close_cache = None
+        self.trading_close_ttl = 60  # 秒
+        
+        # 所有缓存元数据保存在同一个SQLite索引中
+        self.index_path = os.path.join(self.cache_dir, self.INDEX_FILENAME)
+        is_new_index = not os.path.exists(self.index_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_index()
+        
+        # 进程内已反序列化对象的LRU缓存：{cache_key: (数据文件mtime, 数据)}
+        self._obj_cache = OrderedDict()
+        self.obj_cache_size = 32
+        
+        # 已知的缓存键集合，未命中时无需查询索引或访问文件系统
+        with self._lock:
+            self._known_keys = {row[0] for row in self._conn.execute("SELECT cache_key FROM meta")}
+        
+        # 最后访问时间只记录在内存中，实例回收或进程退出时批量写入索引
+        self._access_log = {}
+        self._finalizer = weakref.finalize(self, _close_index, self._conn, self._lock, self._access_log)
+        
+        # 首次创建索引时导入旧版本的元数据文件
+        if is_new_index:
+            self._migrate_legacy_metadata()
     
     def ensure_cache_dir(self):
         """确保缓存目录存在"""
         if not os.path.exists(self.cache_dir):
             os.makedirs(self.cache_dir)
     
+    def _init_index(self):
+        """初始化缓存索引表"""
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    cache_key TEXT PRIMARY KEY,
+                    ticker TEXT,
+                    data_type TEXT,
+                    created_at TEXT,
+                    last_accessed TEXT,
+                    size INTEGER,
+                    serializer TEXT,
+                    kwargs TEXT
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_meta_ticker ON meta(ticker)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_meta_data_type ON meta(data_type)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_meta_last_accessed ON meta(last_accessed)")
+    
     def _get_cache_key(self, ticker: str, data_type: str, **kwargs) -> str:
         """生成缓存键"""
+        if not kwargs:
+            return _simple_cache_key(ticker, data_type)
         key_data = f"{ticker}_{data_type}"
-        if kwargs:
-            key_data += "_" + "_".join([f"{k}_{v}" for k, v in sorted(kwargs.items())])
+        key_data += "_" + "_".join([f"{k}_{v}" for k, v in sorted(kwargs.items())])
         return hashlib.md5(key_data.encode()).hexdigest()
     
-    def _get_cache_path(self, cache_key: str) -> str:
-        """获取缓存文件路径"""
-        return os.path.join(self.cache_dir, f"{cache_key}.pkl")
+    def _get_cache_path(self, cache_key: str, serializer: str = None) -> str:
+        """获取缓存文件路径（旧版本缓存没有记录序列化方式，默认为pickle）"""
+        extension = self.SERIALIZER_EXTENSIONS[serializer or 'pickle']
+        return os.path.join(self.cache_dir, f"{cache_key}{extension}")
+    
+    def _get_all_cache_paths(self, cache_key: str) -> list:
+        """获取所有可能的缓存文件路径（不同序列化方式）"""
+        return [self._get_cache_path(cache_key, serializer) for serializer in self.SERIALIZER_EXTENSIONS]
+    
+    def _choose_serializer(self, data: Any) -> str:
+        """根据数据类型选择缓存文件格式"""
+        if self.serializer == 'pickle':
+            return 'pickle_zstd' if self.compression_level else 'pickle'
+        if isinstance(data, pd.DataFrame):
+            return 'parquet'
+        return 'msgpack_zstd' if self.compression_level else 'msgpack'
+    
+    def _serialize(self, data: Any, f, serializer: str) -> None:
+        """按指定格式写入数据"""
+        if serializer == 'parquet':
+            data.to_parquet(
+                f, engine='pyarrow',
+                compression='zstd' if self.compression_level else None,
+                compression_level=self.compression_level
+            )
+        elif serializer == 'msgpack_zstd':
+            packed = msgpack.packb(data, use_bin_type=True, default=_encode_pandas)
+            f.write(zstandard.ZstdCompressor(level=self.compression_level).compress(packed))
+        elif serializer == 'msgpack':
+            f.write(msgpack.packb(data, use_bin_type=True, default=_encode_pandas))
+        elif serializer == 'pickle_zstd':
+            pickled = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+            f.write(zstandard.ZstdCompressor(level=self.compression_level).compress(pickled))
+        else:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    def _deserialize(self, buffer, serializer: str) -> Any:
+        """按缓存记录的格式从内存缓冲区（bytes或mmap）还原数据"""
+        if serializer in ('msgpack_zstd', 'pickle_zstd'):
+            buffer = zstandard.ZstdDecompressor().decompress(buffer)
+            serializer = serializer[:-len('_zstd')]
+        if serializer == 'msgpack':
+            return msgpack.unpackb(buffer, raw=False, object_hook=_decode_pandas)
+        return pickle.loads(buffer)
     
     def _get_metadata_path(self, cache_key: str) -> str:
-        """获取元数据文件路径"""
+        """获取旧版本元数据文件路径"""
         return os.path.join(self.cache_dir, f"{cache_key}_meta.json")
     
+    def _read_metadata(self, meta_path: str) -> Dict[str, Any]:
+        """读取旧版本元数据文件"""
+        with open(meta_path, 'rb') as f:
+            content = f.read()
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # 兼容旧版本json模块写入的元数据文件
+            return json.loads(content)
+    
+    def _try_read_metadata(self, meta_path: str) -> Optional[Dict[str, Any]]:
+        """读取旧版本元数据文件，损坏时返回None"""
+        try:
+            return self._read_metadata(meta_path)
+        except Exception:
+            return None
+    
+    def _migrate_legacy_metadata(self) -> int:
+        """将旧版本的 *_meta.json 元数据文件导入索引，返回导入的条目数量"""
+        migrated = 0
+        entries = self._scan_cache_dir()
+        meta_entries = [entry for filename, entry in entries.items() if filename.endswith('_meta.json')]
+        if not meta_entries:
+            return migrated
+        
+        # 并行读取元数据文件（I/O密集），随后在当前线程中串行写入索引和删除文件
+        with ThreadPoolExecutor(max_workers=min(16, len(meta_entries))) as executor:
+            metadata_list = list(executor.map(self._try_read_metadata, [entry.path for entry in meta_entries]))
+        
+        for entry, metadata in zip(meta_entries, metadata_list):
+            cache_key = entry.name.replace('_meta.json', '')
+            cache_entry = None
+            if metadata is not None:
+                serializer = metadata.get('serializer', 'pickle')
+                cache_entry = entries.get(os.path.basename(self._get_cache_path(cache_key, serializer)))
+            try:
+                if cache_entry is None:
+                    raise FileNotFoundError(cache_key)
+                # 旧版本的缓存键与当前规则可能不同，按当前规则重命名数据文件
+                size = cache_entry.stat().st_size
+                new_key = self._get_cache_key(metadata['ticker'], metadata['data_type'], **metadata.get('kwargs', {}))
+                if new_key != cache_key:
+                    os.replace(cache_entry.path, self._get_cache_path(new_key, serializer))
+                self._write_metadata(new_key, metadata, size)
+                migrated += 1
+            except Exception:
+                # 元数据损坏或数据文件缺失，删除相关文件
+                self._remove_cache_files(cache_key)
+            else:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        return migrated
+    
+    def _write_metadata(self, cache_key: str, metadata: Dict[str, Any], size: int) -> None:
+        """写入（或覆盖）索引中的元数据"""
+        self._known_keys.add(cache_key)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta "
+                "(cache_key, ticker, data_type, created_at, last_accessed, size, serializer, kwargs) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    cache_key,
+                    metadata.get('ticker'),
+                    metadata.get('data_type'),
+                    metadata['created_at'],
+                    metadata.get('last_accessed', metadata['created_at']),
+                    size,
+                    metadata.get('serializer', 'pickle'),
+                    orjson.dumps(metadata.get('kwargs', {})).decode()
+                )
+            )
+    
+    def _get_metadata(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """从索引读取元数据，不存在时返回None"""
+        if cache_key not in self._known_keys:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ticker, data_type, created_at, last_accessed, serializer, kwargs "
+                "FROM meta WHERE cache_key = ?",
+                (cache_key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return self._row_to_metadata(row)
+    
+    @staticmethod
+    def _row_to_metadata(row: sqlite3.Row) -> Dict[str, Any]:
+        """索引中的一行转换为元数据字典"""
+        return {
+            'ticker': row['ticker'],
+            'data_type': row['data_type'],
+            'created_at': row['created_at'],
+            'last_accessed': row['last_accessed'],
+            'serializer': row['serializer'],
+            'kwargs': orjson.loads(row['kwargs']) if row['kwargs'] else {}
+        }
+    
+    def flush_access_log(self) -> None:
+        """立即将最后访问时间写入索引"""
+        with self._lock:
+            _flush_access_log(self._conn, self._access_log)
+    
     def save_cache(self, ticker: str, data_type: str, data: Any, **kwargs) -> str:
         """保存数据到缓存"""
         cache_key = self._get_cache_key(ticker, data_type, **kwargs)
-        cache_path = self._get_cache_path(cache_key)
-        meta_path = self._get_metadata_path(cache_key)
-        
-        # 保存数据
-        with open(cache_path, 'wb') as f:
-            pickle.dump(data, f)
+        serializer = self._choose_serializer(data)
+        previous = self._get_metadata(cache_key)
+        try:
+            cache_path, size = self._write_cache_file(cache_key, data, serializer)
+        except (ValueError, TypeError, pyarrow.ArrowException):
+            if serializer != 'parquet':
+                raise
+            # 列名或数据类型不支持parquet时，回退到msgpack
+            serializer = 'msgpack_zstd' if self.compression_level else 'msgpack'
+            cache_path, size = self._write_cache_file(cache_key, data, serializer)
+        
+        # 删除旧格式留下的缓存文件（只在索引记录的格式发生变化时才需要）
+        if previous is not None and previous['serializer'] != serializer:
+            try:
+                os.remove(self._get_cache_path(cache_key, previous['serializer']))
+            except (FileNotFoundError, KeyError):
+                pass
         
         # 保存元数据
+        now_str = datetime.now().isoformat()
         metadata = {
             'ticker': ticker,
             'data_type': data_type,
-            'created_at': datetime.now().isoformat(),
-            'last_accessed': datetime.now().isoformat(),
+            'created_at': now_str,
+            'last_accessed': now_str,
+            'serializer': serializer,
             'kwargs': kwargs
         }
         
-        with open(meta_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        with self._lock:
+            self._access_log.pop(cache_key, None)
+            self._obj_cache.pop(cache_key, None)
+        self._write_metadata(cache_key, metadata, size)
         
         return cache_key
     
+    def _write_cache_file(self, cache_key: str, data: Any, serializer: str) -> tuple:
+        """写入缓存数据文件，返回 (文件路径, 文件大小)"""
+        cache_path = self._get_cache_path(cache_key, serializer)
+        
+        # 先写入临时文件再原子替换，避免中途失败留下不完整的缓存文件
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                self._serialize(data, f, serializer)
+                size = f.tell()
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return cache_path, size
+    
     def load_cache(self, ticker: str, data_type: str, allow_expired: bool = False, **kwargs) -> Optional[tuple]:
         """从缓存加载数据，支持过期检查和强制使用过期数据"""
         cache_key = self._get_cache_key(ticker, data_type, **kwargs)
-        cache_path = self._get_cache_path(cache_key)
-        meta_path = self._get_metadata_path(cache_key)
-        
-        if not os.path.exists(cache_path) or not os.path.exists(meta_path):
-            return None
         
         # 读取元数据
         try:
-            with open(meta_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-        except:
+            metadata = self._get_metadata(cache_key)
+        except sqlite3.Error:
             return None
+        if metadata is None:
+            return None
+        return self._load_with_metadata(cache_key, data_type, metadata, allow_expired)
+    
+    def load_all(self, ticker: str, data_types, allow_expired: bool = False) -> Dict[str, tuple]:
+        """一次索引查询加载指定股票的多类（不带额外参数的）缓存，返回 {data_type: (数据, 元数据)}，只包含可用的条目"""
+        data_types = set(data_types)
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT cache_key, ticker, data_type, created_at, last_accessed, serializer, kwargs "
+                    "FROM meta WHERE ticker = ? AND (kwargs IS NULL OR kwargs = '{}')",
+                    (ticker,)
+                ).fetchall()
+        except sqlite3.Error:
+            return {}
+        
+        results = {}
+        for row in rows:
+            data_type = row['data_type']
+            if data_type not in data_types:
+                continue
+            loaded = self._load_with_metadata(row['cache_key'], data_type, self._row_to_metadata(row), allow_expired)
+            if loaded is not None:
+                results[data_type] = loaded
+        return results
+    
+    def _load_with_metadata(self, cache_key: str, data_type: str, metadata: Dict[str, Any],
+                            allow_expired: bool) -> Optional[tuple]:
+        """根据已读取的元数据检查过期并加载缓存数据"""
+        serializer = metadata['serializer']
+        if serializer not in self.SERIALIZER_EXTENSIONS:
+            return None
+        cache_path = self._get_cache_path(cache_key, serializer)
         
         # 检查缓存是否过期
         created_at = datetime.fromisoformat(metadata['created_at'])
@@ -95,19 +479,50 @@ class CacheManager:
         if is_expired and not allow_expired:
             return None
         
-        # 更新最后访问时间
+        data = self._read_cache_data(cache_key, cache_path, serializer)
+        if data is _MISSING:
+            return None
+        
+        # 记录最后访问时间（只记录在内存中，稍后批量写入索引）
         metadata['last_accessed'] = datetime.now().isoformat()
         metadata['is_expired'] = is_expired
-        with open(meta_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        self._access_log[cache_key] = metadata['last_accessed']
+        return data, metadata
+    
+    def _read_cache_data(self, cache_key: str, cache_path: str, serializer: str) -> Any:
+        """读取缓存数据，文件未变化时直接复用进程内已反序列化的对象；读取失败时返回_MISSING"""
+        try:
+            mtime_ns = os.stat(cache_path).st_mtime_ns
+        except FileNotFoundError:
+            return _MISSING
+        
+        with self._lock:
+            cached = self._obj_cache.get(cache_key)
+            if cached is not None and cached[0] == mtime_ns:
+                self._obj_cache.move_to_end(cache_key)
+                return cached[1]
         
-        # 读取数据
+        # 读取数据（内存映射，避免先把整个文件复制到bytes中）
         try:
-            with open(cache_path, 'rb') as f:
-                data = pickle.load(f)
-            return data, metadata
-        except:
-            return None
+            if serializer == 'parquet':
+                data = pd.read_parquet(cache_path, engine='pyarrow', memory_map=True)
+            else:
+                with open(cache_path, 'rb') as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    data = self._deserialize(mm, serializer)
+        except FileNotFoundError:
+            return _MISSING
+        except Exception as e:
+            # 缓存文件损坏，删除后由调用方重新获取
+            print(f"缓存文件损坏，已删除: {cache_path} ({e})")
+            self._remove_cache_files(cache_key)
+            return _MISSING
+        
+        with self._lock:
+            self._obj_cache[cache_key] = (mtime_ns, data)
+            while len(self._obj_cache) > self.obj_cache_size:
+                self._obj_cache.popitem(last=False)
+        return data
     
     def _is_cache_expired(self, data_type: str, created_at: datetime) -> bool:
         """检查缓存是否过期"""
@@ -128,15 +543,19 @@ class CacheManager:
     
     def _is_trading_day_expired(self, created_at: datetime) -> bool:
         """检查基于交易日的缓存是否过期"""
-        # 获取当前美东时间
-        now_et = datetime.now(self.et_tz)
-        created_at_et = created_at.replace(tzinfo=pytz.UTC).astimezone(self.et_tz)
-        
         # 获取最近的交易日收盘时间（美东时间下午4点）
-        last_trading_close = self._get_last_trading_close(now_et)
+        last_trading_close = self._get_last_trading_close_timestamp()
         
-        # 如果缓存创建时间早于最近的交易日收盘时间，则过期
-        return created_at_et < last_trading_close
+        # 如果缓存创建时间早于最近的交易日收盘时间，则过期（直接比较epoch秒）
+        return created_at.replace(tzinfo=timezone.utc).timestamp() < last_trading_close
+    
+    def _get_last_trading_close_timestamp(self) -> float:
+        """获取最近的交易日收盘时间（epoch秒），结果在短时间内复用"""
+        now = time.monotonic()
+        if self._trading_close_cache is None or now - self._trading_close_cache[0] > self.trading_close_ttl:
+            last_trading_close = self._get_last_trading_close(datetime.now(self.et_tz))
+            self._trading_close_cache = (now, last_trading_close.timestamp())
+        return self._trading_close_cache[1]
     
     def _get_last_trading_close(self, current_time_et: datetime) -> datetime:
         """获取最近的交易日收盘时间（美东时间下午4点）"""
@@ -149,7 +568,7 @@ class CacheManager:
         
         # 设置收盘时间为下午4点
         close_time = datetime.combine(current_date, datetime.min.time().replace(hour=16))
-        close_time_et = self.et_tz.localize(close_time)
+        close_time_et = close_time.replace(tzinfo=self.et_tz)
         
         # 如果当前时间是交易日但还没到收盘时间，使用前一个交易日的收盘时间
         if current_time_et.date() == current_date and current_time_et.time() < datetime.min.time().replace(hour=16):
@@ -158,26 +577,23 @@ class CacheManager:
             while prev_date.weekday() >= 5:
                 prev_date -= timedelta(days=1)
             close_time = datetime.combine(prev_date, datetime.min.time().replace(hour=16))
-            close_time_et = self.et_tz.localize(close_time)
+            close_time_et = close_time.replace(tzinfo=self.et_tz)
         
         return close_time_et
     
     def force_refresh_cache(self, ticker: str, data_type: str, **kwargs) -> bool:
         """强制刷新缓存（删除现有缓存）"""
         cache_key = self._get_cache_key(ticker, data_type, **kwargs)
-        cache_path = self._get_cache_path(cache_key)
-        meta_path = self._get_metadata_path(cache_key)
-        
-        deleted = False
-        if os.path.exists(cache_path):
-            os.remove(cache_path)
-            deleted = True
-        
-        if os.path.exists(meta_path):
-            os.remove(meta_path)
-            deleted = True
-        
-        return deleted
+        return self._remove_cache_files(cache_key)
+    
+    def _scan_cache_dir(self) -> Dict[str, os.DirEntry]:
+        """单次扫描缓存目录，返回 {文件名: DirEntry}，DirEntry会缓存stat结果"""
+        with os.scandir(self.cache_dir) as it:
+            return {entry.name: entry for entry in it if entry.is_file()}
+    
+    def _is_index_file(self, filename: str) -> bool:
+        """判断是否为索引数据库文件（包括WAL日志文件）"""
+        return filename.startswith(self.INDEX_FILENAME)
     
     def cleanup_old_cache(self) -> Dict[str, int]:
         """手动清理缓存（已移除自动过期检查）"""
@@ -189,31 +605,54 @@ class CacheManager:
         if not os.path.exists(self.cache_dir):
             return cleanup_stats
         
-        for filename in os.listdir(self.cache_dir):
-            if filename.endswith('_meta.json'):
-                meta_path = os.path.join(self.cache_dir, filename)
-                cache_key = filename.replace('_meta.json', '')
-                cache_path = self._get_cache_path(cache_key)
-                
-                cleanup_stats['total_files'] += 1
-                
-                try:
-                    # 只处理元数据文件损坏的情况
-                    with open(meta_path, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                except Exception as e:
-                    # 如果元数据文件损坏，删除相关文件
-                    self._remove_cache_files(cache_path, meta_path)
-                    cleanup_stats['manually_removed'] += 1
+        entries = self._scan_cache_dir()
+        with self._lock:
+            rows = self._conn.execute("SELECT cache_key, serializer FROM meta").fetchall()
+        
+        # 索引中有记录但数据文件缺失的条目
+        indexed_files = set()
+        for row in rows:
+            cache_filename = os.path.basename(self._get_cache_path(row['cache_key'], row['serializer']))
+            indexed_files.add(cache_filename)
+            cleanup_stats['total_files'] += 1
+            # 扫描之后其他线程可能刚写入该缓存，删除前再确认一次文件确实不存在
+            if cache_filename not in entries and not os.path.exists(os.path.join(self.cache_dir, cache_filename)):
+                self._remove_cache_files(row['cache_key'])
+                cleanup_stats['manually_removed'] += 1
+        
+        # 有数据文件但索引中没有记录的条目（只处理缓存格式的文件，跳过临时文件和刚写入的文件）
+        extensions = tuple(self.SERIALIZER_EXTENSIONS.values())
+        grace_deadline = time.time() - self.ORPHAN_GRACE_SECONDS
+        for filename, entry in entries.items():
+            if filename in indexed_files or not filename.endswith(extensions):
+                continue
+            try:
+                if entry.stat().st_mtime > grace_deadline:
+                    continue
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            cleanup_stats['manually_removed'] += 1
         
         return cleanup_stats
     
-    def _remove_cache_files(self, cache_path: str, meta_path: str):
-        """删除缓存文件和元数据文件"""
-        if os.path.exists(cache_path):
-            os.remove(cache_path)
-        if os.path.exists(meta_path):
-            os.remove(meta_path)
+    def _remove_cache_files(self, cache_key: str) -> bool:
+        """删除缓存文件和索引中的元数据，返回是否删除了内容"""
+        self._known_keys.discard(cache_key)
+        # 对象缓存与加载线程共用，修改时需持有锁
+        with self._lock:
+            self._obj_cache.pop(cache_key, None)
+            self._access_log.pop(cache_key, None)
+        deleted = False
+        for path in self._get_all_cache_paths(cache_key) + [self._get_metadata_path(cache_key)]:
+            try:
+                os.remove(path)
+                deleted = True
+            except FileNotFoundError:
+                pass
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM meta WHERE cache_key = ?", (cache_key,))
+        return deleted or cursor.rowcount > 0
     
     def get_cache_info(self, ticker: str = None) -> Dict[str, Any]:
         """获取缓存信息"""
@@ -226,85 +665,79 @@ class CacheManager:
             'newest_cache': None
         }
         
-        if not os.path.exists(self.cache_dir):
-            return cache_info
-        
-        oldest_time = None
-        newest_time = None
+        # 如果指定了ticker，只统计该ticker的信息
+        where, params = ("WHERE UPPER(ticker) = ?", (ticker.upper(),)) if ticker else ("", ())
+        
+        with self._lock:
+            total_files, total_size, oldest, newest = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(created_at), MAX(created_at) FROM meta {where}",
+                params
+            ).fetchone()
+            by_ticker = self._conn.execute(
+                f"SELECT ticker, COUNT(*) FROM meta {where} GROUP BY ticker", params
+            ).fetchall()
+            by_data_type = self._conn.execute(
+                f"SELECT data_type, COUNT(*) FROM meta {where} GROUP BY data_type", params
+            ).fetchall()
+        
+        cache_info['total_files'] = total_files
+        cache_info['total_size_mb'] = round(total_size / (1024 * 1024), 2)  # MB
+        # NULL和'unknown'归为同一类，用Counter累加而不是互相覆盖
+        ticker_counter = Counter()
+        for ticker_name, count in by_ticker:
+            ticker_counter[ticker_name or 'unknown'] += count
+        data_type_counter = Counter()
+        for data_type, count in by_data_type:
+            data_type_counter[data_type or 'unknown'] += count
+        cache_info['by_ticker'] = dict(ticker_counter)
+        cache_info['by_data_type'] = dict(data_type_counter)
+        
+        # 记录最新和最旧的缓存时间
+        if oldest:
+            cache_info['oldest_cache'] = self._format_time(datetime.fromisoformat(oldest))
+        if newest:
+            cache_info['newest_cache'] = self._format_time(datetime.fromisoformat(newest))
         
-        for filename in os.listdir(self.cache_dir):
-            if filename.endswith('_meta.json'):
-                meta_path = os.path.join(self.cache_dir, filename)
-                cache_key = filename.replace('_meta.json', '')
-                cache_path = self._get_cache_path(cache_key)
-                
-                try:
-                    with open(meta_path, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                    
-                    ticker_name = metadata.get('ticker', 'unknown')
-                    data_type = metadata.get('data_type', 'unknown')
-                    created_at = datetime.fromisoformat(metadata['created_at'])
-                    
-                    # 如果指定了ticker，只统计该ticker的信息
-                    if ticker and ticker_name.upper() != ticker.upper():
-                        continue
-                    
-                    cache_info['total_files'] += 1
-                    
-                    # 计算文件大小
-                    if os.path.exists(cache_path):
-                        size = os.path.getsize(cache_path) / (1024 * 1024)  # MB
-                        cache_info['total_size_mb'] += size
-                    
-                    # 按ticker统计
-                    if ticker_name not in cache_info['by_ticker']:
-                        cache_info['by_ticker'][ticker_name] = 0
-                    cache_info['by_ticker'][ticker_name] += 1
-                    
-                    # 按数据类型统计
-                    if data_type not in cache_info['by_data_type']:
-                        cache_info['by_data_type'][data_type] = 0
-                    cache_info['by_data_type'][data_type] += 1
-                    
-                    # 记录最新和最旧的缓存时间
-                    if oldest_time is None or created_at < oldest_time:
-                        oldest_time = created_at
-                        cache_info['oldest_cache'] = created_at.strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    if newest_time is None or created_at > newest_time:
-                        newest_time = created_at
-                        cache_info['newest_cache'] = created_at.strftime('%Y-%m-%d %H:%M:%S')
-                        
-                except Exception:
-                    continue
-        
-        cache_info['total_size_mb'] = round(cache_info['total_size_mb'], 2)
         return cache_info
     
     def get_data_update_time(self, ticker: str, data_type: str, **kwargs) -> Optional[Dict[str, str]]:
         """获取数据更新时间和状态"""
         cache_key = self._get_cache_key(ticker, data_type, **kwargs)
-        meta_path = self._get_metadata_path(cache_key)
-        
-        if not os.path.exists(meta_path):
-            return None
         
         try:
-            with open(meta_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-            
-            created_at = datetime.fromisoformat(metadata['created_at'])
-            is_expired = self._is_cache_expired(data_type, created_at)
-            
-            return {
-                'update_time': created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'is_expired': is_expired,
-                'status': '已过期' if is_expired else '最新'
-            }
+            metadata = self._get_metadata(cache_key)
+            if metadata is None:
+                return None
+            return self._build_update_status(data_type, metadata['created_at'])
         except:
             return None
     
+    @staticmethod
+    def _format_time(dt: datetime) -> str:
+        """格式化为 '%Y-%m-%d %H:%M:%S'（isoformat比strftime快得多）"""
+        return dt.replace(tzinfo=None).isoformat(sep=' ', timespec='seconds')
+    
+    def _build_update_status(self, data_type: str, created_at_str: str) -> Dict[str, Any]:
+        """根据创建时间生成数据更新时间和状态"""
+        created_at = datetime.fromisoformat(created_at_str)
+        is_expired = self._is_cache_expired(data_type, created_at)
+        
+        return {
+            'update_time': self._format_time(created_at),
+            'update_datetime': created_at,
+            'is_expired': is_expired,
+            'status': '已过期' if is_expired else '最新'
+        }
+    
+    def _load_metas_for_ticker(self, ticker: str) -> Dict[str, Dict[str, Any]]:
+        """一次查询获取指定股票所有（不带额外参数的）缓存元数据，返回 {data_type: metadata}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data_type, created_at FROM meta WHERE ticker = ? AND (kwargs IS NULL OR kwargs = '{}')",
+                (ticker,)
+            ).fetchall()
+        return {row['data_type']: {'created_at': row['created_at']} for row in rows}
+    
     def get_cache_status_summary(self, ticker: str) -> Dict[str, Any]:
         """获取指定股票的缓存状态摘要"""
         data_types = ['stock_data', 'stock_info', 'eps_ttm', 'forward_eps']
@@ -319,8 +752,18 @@ class CacheManager:
         
         latest_update = None
         
+        try:
+            metas = self._load_metas_for_ticker(ticker)
+        except sqlite3.Error:
+            metas = {}
+        
         for data_type in data_types:
-            status_info = self.get_data_update_time(ticker, data_type)
+            status_info = None
+            if data_type in metas:
+                try:
+                    status_info = self._build_update_status(data_type, metas[data_type]['created_at'])
+                except (TypeError, ValueError):
+                    status_info = None
             status_summary['total_count'] += 1
             
             if status_info:
@@ -329,7 +772,7 @@ class CacheManager:
                     status_summary['expired_count'] += 1
                 
                 # 记录最新的更新时间
-                update_time = datetime.strptime(status_info['update_time'], '%Y-%m-%d %H:%M:%S')
+                update_time = status_info['update_datetime']
                 if latest_update is None or update_time > latest_update:
                     latest_update = update_time
             else:
@@ -342,7 +785,7 @@ class CacheManager:
         
         # 设置最后更新时间
         if latest_update:
-            status_summary['last_update'] = latest_update.strftime('%Y-%m-%d %H:%M:%S')
+            status_summary['last_update'] = self._format_time(latest_update)
         
         # 确定整体状态
         if status_summary['expired_count'] == 0:
@@ -367,12 +810,24 @@ class CacheManager:
         """清理所有缓存文件，返回清理的文件数量"""
         if not os.path.exists(self.cache_dir):
             return 0
-            
+        
+        self._known_keys.clear()
+        with self._lock:
+            self._obj_cache.clear()
+            self._access_log.clear()
         removed_count = 0
-        for filename in os.listdir(self.cache_dir):
-            file_path = os.path.join(self.cache_dir, filename)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-                removed_count += 1
-                
-        return removed_count
\ No newline at end of file
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                # is_file() 使用目录项中已有的类型信息，不需要额外stat
+                if not entry.is_file() or self._is_index_file(entry.name):
+                    continue
+                try:
+                    os.unlink(entry.path)
+                    removed_count += 1
+                except FileNotFoundError:
+                    pass
+        
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM meta")
+        
+        return removed_count
@@ -1,23 +1,22 @@
 import streamlit as st
 import yfinance as yf
+from yfinance.exceptions import YFRateLimitError
+import requests
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-import plotly.express as px
-from datetime import datetime, timedelta
-# 移除爬虫相关导入
-# import requests
-# from bs4 import BeautifulSoup
-import json
-import io
-import base64
+from datetime import date, datetime
 import warnings
-import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from cache_manager import CacheManager
+from rate_limiter import RateLimitExceeded, TokenBucket
 warnings.filterwarnings('ignore')
 
 # 初始化API调用计数器
-today = datetime.now().date()
+today = date.today()
 
 # 检查是否需要重置计数（新的一天或首次运行）
 if ('api_call_count' not in st.session_state or 
@@ -28,26 +27,97 @@ if ('api_call_count' not in st.session_state or
     st.session_state.api_call_date = today
     st.session_state.using_cached_data = False  # 是否正在使用缓存数据
 
+# API调用计数锁（数据获取会在多个线程中并行执行）
+api_call_lock = threading.Lock()
+
 # API调用计数函数
 def increment_api_call_count():
-    # 检查是否需要重置计数（新的一天）
-    today = datetime.now().date()
-    if 'api_call_date' not in st.session_state or st.session_state.api_call_date != today:
-        st.session_state.api_call_count = 0
-        st.session_state.api_call_date = today
-    
-    # 增加计数
-    st.session_state.api_call_count += 1
-    
-    return st.session_state.api_call_count
+    with api_call_lock:
+        # 检查是否需要重置计数（新的一天）
+        today = date.today()
+        if 'api_call_date' not in st.session_state or st.session_state.api_call_date != today:
+            st.session_state.api_call_count = 0
+            st.session_state.api_call_date = today
+        
+        # 增加计数
+        st.session_state.api_call_count += 1
+        
+        return st.session_state.api_call_count
+
+# 并行执行多个独立的数据获取任务
+def run_in_parallel(tasks):
+    """并行执行互不依赖的I/O任务，返回与tasks顺序一致的Future列表"""
+    # 工作线程需要绑定当前脚本的运行上下文，才能访问session_state和输出提示信息
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=len(tasks), initializer=add_script_run_ctx, initargs=(None, ctx)) as executor:
+        return [executor.submit(task) for task in tasks]
+
+# 在session_state中记住构建结果，输入未变化的rerun直接复用
+def memoize_in_session(key, inputs, build):
+    """inputs中每项与上次相同（同一对象，或相等的标量）时返回上次的结果，否则调用build重新构建"""
+    def same(a, b):
+        if a is b:
+            return True
+        return isinstance(a, (int, float, str)) and isinstance(b, (int, float, str)) and a == b
+    
+    cached = st.session_state.get(key)
+    if cached is not None and len(cached[0]) == len(inputs) and all(map(same, cached[0], inputs)):
+        return cached[1]
+    result = build()
+    # 保存输入对象本身的引用，保证同一性比较不会因对象回收后id复用而误判
+    st.session_state[key] = (tuple(inputs), result)
+    return result
+
+# 进程内共享的API限流器（Yahoo按IP限流，所有会话共用同一个令牌桶）
+@st.cache_resource(show_spinner=False)
+def get_rate_limiter():
+    return TokenBucket()
+
+# 可重试的网络错误：连接失败和超时（新版yfinance使用curl_cffi，旧版使用requests）
+TRANSIENT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+try:
+    # yfinance 1.x 直接抛出curl_cffi的异常（如DNSError，属于ConnectionError的子类）
+    from curl_cffi.requests import exceptions as curl_exceptions
+    TRANSIENT_ERRORS += (curl_exceptions.ConnectionError, curl_exceptions.Timeout)
+except ImportError:
+    pass
+
+def is_transient_error(error):
+    """判断是否为临时性错误（网络连接/超时或服务端5xx），其他错误重试也不会成功"""
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return isinstance(status_code, int) and status_code >= 500
 
 # 安全的API调用函数
-def safe_api_call(func, *args, **kwargs):
-    """安全的API调用"""
-    try:
-        return func(*args, **kwargs)
-    except Exception as e:
-        raise e
+def safe_api_call(func, *args, retries=2, backoff=0.3, **kwargs):
+    """安全的API调用：先通过令牌桶限流，遇到临时性网络错误时按指数退避重试"""
+    rate_limiter = get_rate_limiter()
+    last_error = None
+    for attempt in range(retries + 1):
+        try:
+            rate_limiter.acquire()
+        except RateLimitExceeded as e:
+            # 本地限流（包括重试时令牌不足）单独抛出，调用方据此与API失败区分；重试时保留上次的API错误作为原因
+            raise e from last_error
+        increment_api_call_count()  # 每次实际发出的请求都计数（包括重试）
+        try:
+            return func(*args, **kwargs)
+        except YFRateLimitError:
+            # 被限流时降低请求速率，立即重试只会加重限流
+            rate_limiter.penalize()
+            raise
+        except Exception as e:
+            if attempt == retries or not is_transient_error(e):
+                raise
+            last_error = e
+            time.sleep(backoff * (2 ** attempt))
+
+def cache_fallback_message(error):
+    """使用过期缓存数据时的提示，区分本地限流和API调用失败"""
+    if isinstance(error, RateLimitExceeded):
+        return "API调用过于频繁，正在使用缓存数据"
+    return "API调用失败，正在使用缓存数据"
 
 # 页面配置
 st.set_page_config(
@@ -83,12 +153,74 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# 财年推算：各字段对应的转换函数，返回财年或None（无法解析时）
+def _fiscal_year_from_timestamp(value, current_date):
+    """最新财报日期（Unix时间戳）的年份即为当前财年"""
+    return datetime.fromtimestamp(value).year
+
+def _fiscal_year_from_date_string(value, current_date):
+    """下一次财报日期（'YYYY-MM-DD'字符串）的年份即为当前财年"""
+    return date.fromisoformat(value).year
+
+def _fiscal_year_from_year_end(value, current_date):
+    """上一财年结束日（Unix时间戳）已过去的部分计入下一财年"""
+    last_fiscal_year_end = datetime.fromtimestamp(value)
+    fiscal_year = last_fiscal_year_end.year
+    if (current_date.month, current_date.day) > (last_fiscal_year_end.month, last_fiscal_year_end.day):
+        fiscal_year += 1
+    return fiscal_year
+
+# 按优先级排列的财年数据来源
+FISCAL_YEAR_SOURCES = (
+    ('earningsDate', _fiscal_year_from_timestamp),
+    ('nextEarningsDate', _fiscal_year_from_date_string),
+    ('lastFiscalYearEnd', _fiscal_year_from_year_end),
+)
+
+def resolve_fiscal_year(info, current_date):
+    """依次尝试各数据来源确定当前财年，都不可用时使用当前日历年"""
+    for key, convert in FISCAL_YEAR_SOURCES:
+        value = info.get(key)
+        if value is None:
+            continue
+        try:
+            return convert(value, current_date)
+        except (TypeError, ValueError, OverflowError, OSError) as e:
+            print(f"解析财年信息 {key} 时出错: {e}")
+    return current_date.year
+
+@st.cache_resource(show_spinner=False)
+def get_cache_manager():
+    """进程内共享的缓存管理器，已反序列化的数据在多次rerun之间复用"""
+    return CacheManager()
+
 class 滚动PECalculator:
     def __init__(self):
         self.ticker = None
         self.stock_data = None
         self.eps_ttm = None
-        self.cache_manager = CacheManager()
+        self.cache_manager = get_cache_manager()
+        # 同一次运行内共享的 info，避免重复请求 yf.Ticker(...).info
+        self._ticker_info = {}
+        self._info_lock = threading.Lock()
+    
+    def _get_ticker_info(self, ticker):
+        """获取股票 info，同一 ticker 在本次运行中只请求一次"""
+        with self._info_lock:
+            if ticker not in self._ticker_info:
+                try:
+                    info = safe_api_call(lambda: yf.Ticker(ticker).info)  # stock.info是属性，不是方法
+                except Exception as e:
+                    # 失败结果同样记下，避免并行任务对同一 ticker 重复请求
+                    self._ticker_info[ticker] = e
+                else:
+                    self._ticker_info[ticker] = info
+                    # 保存到缓存
+                    self.cache_manager.save_cache(ticker, 'stock_info', info)
+            result = self._ticker_info[ticker]
+        if isinstance(result, Exception):
+            raise result
+        return result
         
     def get_stock_data(self, ticker, force_refresh=False):
         """获取股票历史数据，支持缓存回退"""
@@ -102,8 +234,12 @@ class 滚动PECalculator:
         # 尝试获取新数据
         try:
             stock = yf.Ticker(ticker)
-            increment_api_call_count()  # 增加API调用计数
             stock_data = safe_api_call(stock.history, period="1y")
+            if stock_data is None or stock_data.empty:
+                # yfinance 请求失败时可能只返回空表，不能当作有效数据缓存
+                raise ValueError("未获取到股价数据")
+            # 后续计算只用到收盘价，只保留该列以减小缓存文件和会话中的数据量
+            stock_data = stock_data[['Close']]
             
             # 保存到缓存
             self.cache_manager.save_cache(ticker, 'stock_data', stock_data)
@@ -113,7 +249,7 @@ class 滚动PECalculator:
             # 尝试使用过期的缓存数据
             cached_data = self.cache_manager.load_cache(ticker, 'stock_data', allow_expired=True)
             if cached_data:
-                st.warning(f"API调用失败，正在使用缓存数据")
+                st.warning(cache_fallback_message(e))
                 return cached_data
             else:
                 st.error(f"获取股票数据失败: {e}")
@@ -130,9 +266,8 @@ class 滚动PECalculator:
         
         # 尝试获取新数据
         try:
-            stock = yf.Ticker(ticker)
-            increment_api_call_count()  # 增加API调用计数
-            info = stock.info  # stock.info是属性，不是方法，不需要通过safe_api_call调用
+            # 与股票信息共用同一份info（优先使用缓存）
+            info = self.get_stock_info(ticker, force_refresh=force_refresh)
             eps_ttm = info.get('trailingEps', None)
             
             # 保存到缓存
@@ -143,47 +278,92 @@ class 滚动PECalculator:
             # 尝试使用过期的缓存数据
             cached_data = self.cache_manager.load_cache(ticker, 'eps_ttm', allow_expired=True)
             if cached_data:
-                st.warning(f"API调用失败，正在使用缓存数据")
+                st.warning(cache_fallback_message(e))
                 return cached_data
             else:
                 st.error(f"获取EPS数据失败: {e}")
                 return None, None
     
+    def get_stock_info(self, ticker, force_refresh=False):
+        """获取股票基本信息，优先使用缓存"""
+        # 检查缓存中是否有股票信息（强制刷新时跳过）
+        if not force_refresh:
+            cached_info = self.cache_manager.load_cache(ticker, 'stock_info')
+            if cached_info:
+                return cached_info[0]
+        
+        # 获取股票信息（本次运行内与其他方法共享，同时写入缓存）
+        return self._get_ticker_info(ticker)
+    
+    def fetch_all(self, ticker, force_refresh=False):
+        """并行获取股价、股票信息、TTM EPS和前瞻EPS，按此顺序返回Future列表
+        
+        有效缓存通过一次索引查询批量读取，只为缓存未命中的数据启动获取任务；
+        后三者共享同一次 info 请求，缓存全部未命中时也只需两次网络请求
+        """
+        getters = {
+            'stock_data': self.get_stock_data,
+            'stock_info': self.get_stock_info,
+            'eps_ttm': self.get_eps_ttm,
+            'forward_eps': self.get_forward_eps_estimates
+        }
+        preloaded = {} if force_refresh else self.cache_manager.load_all(ticker, getters)
+        
+        missing = [data_type for data_type in getters if data_type not in preloaded]
+        fetched = dict(zip(missing, run_in_parallel([
+            partial(getters[data_type], ticker, force_refresh=force_refresh) for data_type in missing
+        ]))) if missing else {}
+        
+        futures = []
+        for data_type in getters:
+            if data_type in fetched:
+                futures.append(fetched[data_type])
+                continue
+            # 命中缓存的数据包装成已完成的Future，与获取任务的返回格式一致
+            data, metadata = preloaded[data_type]
+            future = Future()
+            future.set_result(data if data_type == 'stock_info' else (data, metadata))
+            futures.append(future)
+        return futures
+    
     def calculate_pe_range(self, price_data, eps):
         """计算滚动PE区间"""
         if eps is None or eps <= 0:
             return None
         
-        pe_values = price_data['Close'] / eps  # 计算滚动PE值
-        pe_values = pe_values.dropna()
+        # 在NumPy数组上一次性计算滚动PE及各项统计值
+        close = price_data['Close']
+        pe_array = close.to_numpy(dtype=np.float64, copy=False) / eps  # 计算滚动PE值
+        valid = ~np.isnan(pe_array)
+        pe_array = pe_array[valid]
         
-        if pe_values.empty:
+        if pe_array.size == 0:
             return None
         
-        pe_mean = pe_values.mean()
-        pe_std = pe_values.std()
-        pe_median = pe_values.median()
-        pe_min = pe_values.min()
-        pe_max = pe_values.max()
+        pe_mean = pe_array.mean()
+        pe_std = pe_array.std(ddof=1) if pe_array.size > 1 else np.nan  # 与pandas一致使用样本标准差
+        # 最小值、中位数、最大值在同一次分区中求出
+        pe_min, pe_median, pe_max = np.percentile(pe_array, [0, 50, 100])
+        # 仅为绘图包装成Series，趋势图直接复用
+        pe_values = pd.Series(pe_array, index=close.index[valid], name=close.name)
         
         # 使用均值±1标准差作为区间
         pe_lower = max(0, pe_mean - pe_std)
         pe_upper = pe_mean + pe_std
         
+        # 统计值转换为Python float，界面直接使用无需再转换
         return {
-            'pe_mean': round(pe_mean, 2),
-            'pe_median': round(pe_median, 2),
-            'pe_std': round(pe_std, 2),
-            'pe_lower': round(pe_lower, 2),
-            'pe_upper': round(pe_upper, 2),
-            'pe_min': round(pe_min, 2),
-            'pe_max': round(pe_max, 2),
+            'pe_mean': round(float(pe_mean), 2),
+            'pe_median': round(float(pe_median), 2),
+            'pe_std': round(float(pe_std), 2),
+            'pe_lower': round(float(pe_lower), 2),
+            'pe_upper': round(float(pe_upper), 2),
+            'pe_min': round(float(pe_min), 2),
+            'pe_max': round(float(pe_max), 2),
             'pe_values': pe_values,
             'data_points': len(pe_values)
         }
     
-    # 已移除爬虫相关函数 get_eps_from_seeking_alpha
-    
     def get_forward_eps_estimates(self, ticker, force_refresh=False):
         """获取前瞻EPS估计，支持缓存回退"""
         # 优先检查缓存（不强制刷新时）
@@ -194,75 +374,11 @@ class 滚动PECalculator:
                 return forward_eps, metadata
         
         try:
-            # 检查缓存中是否有股票信息
-            if not force_refresh:
-                cached_info = self.cache_manager.load_cache(ticker, 'stock_info', allow_expired=False)
-                if cached_info:
-                    info, metadata = cached_info
-                else:
-                    # 尝试获取新的股票信息
-                    stock = yf.Ticker(ticker)
-                    increment_api_call_count()  # 增加API调用计数
-                    info = stock.info  # stock.info是属性，不是方法
-                    # 保存到缓存
-                    self.cache_manager.save_cache(ticker, 'stock_info', info)
-            else:
-                # 强制刷新
-                stock = yf.Ticker(ticker)
-                increment_api_call_count()  # 增加API调用计数
-                info = stock.info  # stock.info是属性，不是方法
-                # 保存到缓存
-                self.cache_manager.save_cache(ticker, 'stock_info', info)
-            
-            # 获取当前日期
-            current_date = datetime.now()
+            # 获取股票信息（优先使用缓存）
+            info = self.get_stock_info(ticker, force_refresh=force_refresh)
             
-            # 尝试获取公司的最新财报日期和财年
-            try:
-                # 首先尝试获取最新财报日期
-                if 'earningsDate' in info and info['earningsDate'] is not None:
-                    # earningsDate是Unix时间戳，需要转换
-                    earnings_date = datetime.fromtimestamp(info['earningsDate'])
-                    # 使用最新财报发布日期的年份作为当前财年
-                    current_fiscal_year = earnings_date.year
-                # 如果没有earningsDate，尝试使用nextEarningsDate
-                elif 'nextEarningsDate' in info and info['nextEarningsDate'] is not None:
-                    # 下一次财报日期可能是字符串格式，需要转换
-                    try:
-                        next_earnings_date = datetime.strptime(info['nextEarningsDate'], '%Y-%m-%d')
-                        # 使用下一次财报日期的年份作为当前财年
-                        current_fiscal_year = next_earnings_date.year
-                    except:
-                        # 如果转换失败，回退到lastFiscalYearEnd逻辑
-                        if 'lastFiscalYearEnd' in info:
-                            last_fiscal_year_end = datetime.fromtimestamp(info['lastFiscalYearEnd'])
-                            fiscal_year = last_fiscal_year_end.year
-                            
-                            # 计算当前财年
-                            current_fiscal_year = fiscal_year
-                            if current_date.month > last_fiscal_year_end.month or \
-                               (current_date.month == last_fiscal_year_end.month and current_date.day > last_fiscal_year_end.day):
-                                current_fiscal_year += 1
-                        else:
-                            # 如果无法获取财年信息，则使用当前日历年
-                            current_fiscal_year = current_date.year
-                # 如果没有财报日期信息，回退到lastFiscalYearEnd逻辑
-                elif 'lastFiscalYearEnd' in info:
-                    last_fiscal_year_end = datetime.fromtimestamp(info['lastFiscalYearEnd'])
-                    fiscal_year = last_fiscal_year_end.year
-                    
-                    # 计算当前财年
-                    current_fiscal_year = fiscal_year
-                    if current_date.month > last_fiscal_year_end.month or \
-                       (current_date.month == last_fiscal_year_end.month and current_date.day > last_fiscal_year_end.day):
-                        current_fiscal_year += 1
-                else:
-                    # 如果无法获取财年信息，则使用当前日历年
-                    current_fiscal_year = current_date.year
-            except Exception as e:
-                print(f"获取财年信息时出错: {e}")
-                # 如果出错，则使用当前日历年
-                current_fiscal_year = current_date.year
+            # 根据财报日期/财年结束日确定当前财年
+            current_fiscal_year = resolve_fiscal_year(info, datetime.now())
             
             # 创建财年标签 - 只保留当前财年和下一财年
             fy_current = f"FY{current_fiscal_year}"
@@ -292,7 +408,7 @@ class 滚动PECalculator:
             # 尝试使用过期的缓存数据
             cached_data = self.cache_manager.load_cache(ticker, 'forward_eps', allow_expired=True)
             if cached_data:
-                st.warning(f"API调用失败，正在使用缓存数据")
+                st.warning(cache_fallback_message(e))
                 return cached_data
             
             print(f"获取前瞻EPS估计时出错: {e}")
@@ -316,23 +432,29 @@ class 滚动PECalculator:
         pe_upper = pe_range['pe_upper']
         pe_median = pe_range['pe_median']
         
-        for year, eps in forward_eps.items():
-            if eps and eps > 0:  # 只处理有效的EPS数据
-                valuation_lower = eps * pe_lower
-                valuation_upper = eps * pe_upper
-                valuation_median = eps * pe_median
-                
-                results.append({
-                    'year': year,  # 直接使用财年标识，如'FY2023'
-                    'eps': f"${eps:.2f}",
-                    'eps_raw': eps,
-                    'pe_range': f"{pe_lower:.2f}–{pe_upper:.2f}",
-                    'valuation_lower': valuation_lower,
-                    'valuation_upper': valuation_upper,
-                    'valuation_median': valuation_median,
-                    'valuation_range': f"${valuation_lower:.2f} – （中位：{valuation_median:.2f}） – {valuation_upper:.2f}",
-                    'source': 'Yahoo Finance 分析师共识'
-                })
+        # 只处理有效的EPS数据
+        valid_items = [(year, eps) for year, eps in forward_eps.items() if eps and eps > 0]
+        if not valid_items:
+            return results
+        
+        # 一次矩阵运算得到各财年的估值：行为财年，列为(下限, 中位, 上限)
+        eps_array = np.array([eps for _, eps in valid_items], dtype=np.float64)
+        pe_array = np.array([pe_lower, pe_median, pe_upper], dtype=np.float64)
+        valuations = np.outer(eps_array, pe_array).tolist()
+        
+        pe_range_text = f"{pe_lower:.2f}–{pe_upper:.2f}"
+        for (year, eps), (valuation_lower, valuation_median, valuation_upper) in zip(valid_items, valuations):
+            results.append({
+                'year': year,  # 直接使用财年标识，如'FY2023'
+                'eps': f"${eps:.2f}",
+                'eps_raw': eps,
+                'pe_range': pe_range_text,
+                'valuation_lower': valuation_lower,
+                'valuation_upper': valuation_upper,
+                'valuation_median': valuation_median,
+                'valuation_range': f"${valuation_lower:.2f} – （中位：{valuation_median:.2f}） – {valuation_upper:.2f}",
+                'source': 'Yahoo Finance 分析师共识'
+            })
         
         return results
 
@@ -341,21 +463,76 @@ def create_valuation_chart(valuation_results):
     if not valuation_results:
         return None
     
-    years = [result['year'] for result in valuation_results]
-    lower_values = [result['valuation_lower'] for result in valuation_results]
-    upper_values = [result['valuation_upper'] for result in valuation_results]
-    median_values = [result['valuation_median'] for result in valuation_results]
+    import plotly.graph_objects as go  # 仅在绘图时导入，缩短首次加载时间
+    
+    # 单次遍历取出各财年的估值，并同时生成中位值横线和数值标签
+    n = len(valuation_results)
+    lower_values = np.empty(n)
+    upper_values = np.empty(n)
+    median_values = np.empty(n)
+    shapes = []
+    median_annotations = []
+    label_annotations = []
+    x_offset = 0.2  # 横线半宽，使横线宽度与柱状图宽度一致
+    for i, result in enumerate(valuation_results):
+        # 使用索引i作为x轴位置，而不是尝试转换year字符串
+        lower_values[i] = lower = result['valuation_lower']
+        upper_values[i] = upper = result['valuation_upper']
+        median_values[i] = median = result['valuation_median']
+        
+        # 中位值横线
+        shapes.append(dict(
+            type="line",
+            x0=i - x_offset,  # 左侧起点
+            y0=median,
+            x1=i + x_offset,  # 右侧终点
+            y1=median,
+            line=dict(color="white", width=3),
+        ))
+        
+        # 中位值文本
+        median_annotations.append(dict(
+            x=i,
+            y=median,
+            text=f'${median:.2f}',
+            showarrow=False,
+            font=dict(family='DIN', size=32, color='white', weight='bold'),  # 增大字体并加粗
+            yshift=40,  # 向上移动文字
+            xshift=0
+        ))
+        
+        # 上限标签和下限标签：使用与柱子相同的颜色，左对齐紧贴柱状图右侧
+        label_annotations.append(dict(
+            x=i,
+            y=upper,
+            text=f'${upper:.2f}',
+            showarrow=False,
+            font=dict(family='DIN', size=21, color='#E8AB29'),
+            yshift=10,  # 向上移动文字，避免与柱子重叠
+            xshift=130,
+            xanchor='left'
+        ))
+        label_annotations.append(dict(
+            x=i,
+            y=lower,
+            text=f'${lower:.2f}',
+            showarrow=False,
+            font=dict(family='DIN', size=21, color='#2CCB7B'),
+            yshift=10,  # 向上移动文字，避免与柱子重叠
+            xshift=130,
+            xanchor='left'
+        ))
     
     # 创建数值索引作为x轴位置
-    x_positions = list(range(len(years)))
+    x_positions = list(range(n))
     
     # 创建适当的财年标签
-    if len(years) == 1:
+    if n == 1:
         fiscal_labels = ["当前财年"]
-    elif len(years) == 2:
+    elif n == 2:
         fiscal_labels = ["当前财年", "下一财年"]
     else:
-        fiscal_labels = [f"财年{i+1}" for i in range(len(years))]
+        fiscal_labels = [f"财年{i+1}" for i in range(n)]
     
     fig = go.Figure()
     
@@ -378,61 +555,6 @@ def create_valuation_chart(valuation_results):
         width=0.4  # 减小柱子宽度
     ))
     
-    # 添加中位值线 - 修改为每个柱状图上的独立横线
-    for i, year in enumerate(years):
-        # 添加中位值横线
-        # 使用索引i作为数值位置，而不是尝试转换year字符串
-        x_position = i  # 使用索引作为x轴位置
-        # 计算横线的起点和终点，使其宽度与柱状图相似
-        x_offset = 0.2  # 修改为0.2，使横线宽度与柱状图宽度一致
-        fig.add_shape(
-            type="line",
-            x0=x_position - x_offset,  # 左侧起点
-            y0=median_values[i],
-            x1=x_position + x_offset,  # 右侧终点
-            y1=median_values[i],
-            line=dict(color="white", width=3),
-        )
-        
-        # 添加中位值文本
-        fig.add_annotation(
-            x=x_position,  # 使用索引位置而不是year字符串
-            y=median_values[i],
-            text=f'${median_values[i]:.2f}',
-            showarrow=False,
-            font=dict(family='DIN', size=32, color='white', weight='bold'),  # 增大字体并加粗
-            yshift=40,  # 向上移动文字
-            xshift=0
-        )
-    
-    # 添加标签
-    for i, year in enumerate(years):
-        # 使用索引i作为x轴位置
-        x_position = i
-        # 添加上限标签
-        fig.add_annotation(
-            x=x_position,  # 使用索引位置而不是year字符串
-            y=upper_values[i],
-            text=f'${upper_values[i]:.2f}',
-            showarrow=False,
-            font=dict(family='DIN', size=21, color='#E8AB29'),  # 使用与柱子相同的颜色，字体大小缩小一倍
-            yshift=10,  # 向上移动文字，避免与柱子重叠
-            xshift=130,  # 减小右移距离，使标签紧贴柱状图右侧
-            xanchor='left'  # 左对齐，使标签最左边与柱状图最右边对齐
-        )
-        
-        # 添加下限标签
-        fig.add_annotation(
-            x=x_position,  # 使用索引位置而不是year字符串
-            y=lower_values[i],
-            text=f'${lower_values[i]:.2f}',
-            showarrow=False,
-            font=dict(family='DIN', size=21, color='#2CCB7B'),  # 使用与柱子相同的颜色，字体大小缩小一倍
-            yshift=10,  # 向上移动文字，避免与柱子重叠
-            xshift=130,  # 减小右移距离，使标签紧贴柱状图右侧
-            xanchor='left'  # 左对齐，使标签最左边与柱状图最右边对齐
-        )
-    
     # 设置x轴刻度为年份标签
     fig.update_layout(
         title='前瞻估值分析',
@@ -444,6 +566,9 @@ def create_valuation_chart(valuation_results):
         ),
         yaxis_title='股价 (USD)',
         barmode='overlay',
+        # 横线和标注一次性写入布局，避免逐个调用add_shape/add_annotation
+        shapes=shapes,
+        annotations=median_annotations + label_annotations,
         height=500,
         width=800,  # 设置固定宽度以与上面的文字保持一致
         showlegend=True
@@ -451,49 +576,37 @@ def create_valuation_chart(valuation_results):
     
     return fig
 
-def create_pe_trend_chart(price_data, eps, cache_warning=""):
-    """创建滚动PE趋势图表"""
-    if eps is None or eps <= 0:
+# 滚动PE趋势图最多绘制的数据点数
+PE_TREND_MAX_POINTS = 500
+
+def create_pe_trend_chart(pe_stats, cache_warning=""):
+    """创建滚动PE趋势图表（复用calculate_pe_range的计算结果）"""
+    if pe_stats is None:
         return None
     
-    pe_values = price_data['Close'] / eps  # 计算滚动PE值
-    pe_values = pe_values.dropna()
-    
-    if pe_values.empty:
-        return None
+    import plotly.graph_objects as go  # 仅在绘图时导入，缩短首次加载时间
     
-    # 计算PE统计值
-    pe_mean = pe_values.mean()
-    pe_std = pe_values.std()
-    pe_lower = max(0, pe_mean - pe_std)
-    pe_upper = pe_mean + pe_std
+    pe_values = pe_stats['pe_values']
+    pe_mean = pe_stats['pe_mean']
     current_pe = pe_values.iloc[-1]
     
-    fig = go.Figure()
+    # 数据点过多时等间隔抽样绘制（保留最后一个点），减少传给前端的数据量
+    trend_values = pe_values
+    if len(trend_values) > PE_TREND_MAX_POINTS:
+        step = -(-len(trend_values) // PE_TREND_MAX_POINTS)
+        trend_values = trend_values.iloc[::-1].iloc[::step].iloc[::-1]
     
-    # 添加滚动PE趋势线
-    fig.add_trace(go.Scatter(
-        x=pe_values.index,
-        y=pe_values.values,
+    # 滚动PE趋势线（WebGL渲染）
+    trend_trace = go.Scattergl(
+        x=trend_values.index,
+        y=trend_values.values,
         mode='lines',
         name='每日滚动PE',
         line=dict(color='#4285F4', width=2)
-    ))
-    
-    # 添加均值线
-    fig.add_hline(y=pe_mean, line_dash='dash', line_color='#F4BB40', 
-                  annotation=dict(
-                      text=f'均值: {pe_mean:.2f}',
-                      font=dict(size=17),
-                      align='right',
-                      xshift=90,  # 增加右侧偏移量，移到红框标记的位置
-                      yshift=0
-                  ))
+    )
     
-
-
-    # 添加当前PE标记
-    fig.add_trace(go.Scatter(
+    # 当前PE标记
+    current_trace = go.Scatter(
         x=[pe_values.index[-1]],
         y=[current_pe],
         mode='markers+text',
@@ -501,17 +614,36 @@ def create_pe_trend_chart(price_data, eps, cache_warning=""):
         text=f'当前滚动PE: {current_pe:.2f}',
         textposition='top center',
         name='当前滚动PE'
-    ))
+    )
+    
+    # 均值线及其标注直接写入布局（与add_hline生成的结果相同，但无需逐个校验和复制布局）
+    mean_line = dict(
+        type='line', xref='x domain', x0=0, x1=1, yref='y', y0=pe_mean, y1=pe_mean,
+        line=dict(color='#F4BB40', dash='dash')
+    )
+    mean_annotation = dict(
+        text=f'均值: {pe_mean:.2f}',
+        font=dict(size=17),
+        align='right',
+        showarrow=False,
+        xref='x domain', x=1, xanchor='right',
+        yref='y', y=pe_mean, yanchor='bottom',
+        xshift=90,  # 增加右侧偏移量，移到红框标记的位置
+        yshift=0
+    )
     
     # 添加缓存数据提示到图表标题
     chart_title = '滚动PE趋势分析（过去12个月）'
     if cache_warning:
         chart_title += cache_warning
     
+    fig = go.Figure(data=[trend_trace, current_trace])
     fig.update_layout(
         title=chart_title,
-    xaxis_title='日期',
-    yaxis_title='滚动PE倍数',
+        xaxis_title='日期',
+        yaxis_title='滚动PE倍数',
+        shapes=[mean_line],
+        annotations=[mean_annotation],
         height=400,
         width=800,  # 设置固定宽度以与上面的文字保持一致
         xaxis=dict(
@@ -525,6 +657,215 @@ def create_pe_trend_chart(price_data, eps, cache_warning=""):
     
     return fig
 
+# 市值显示单位：(单位数值, 后缀)，按从大到小匹配，都不满足时以百万显示
+MARKET_CAP_SCALES = ((1e12, 'T'), (1e9, 'B'))
+
+def format_market_cap(market_cap):
+    """将市值格式化为带T/B/M单位的字符串"""
+    for scale, suffix in MARKET_CAP_SCALES:
+        if market_cap > scale:
+            return f"${market_cap/scale:.2f}{suffix}"
+    return f"${market_cap/1e6:.2f}M"
+
+def load_ticker_data(calculator, ticker, force_refresh):
+    """获取股票全部数据并存入session state，失败时显示错误并返回False"""
+    stock_data_future, stock_info_future, eps_future, forward_eps_future = calculator.fetch_all(ticker, force_refresh)
+    
+    # 获取股票数据
+    stock_data_result = stock_data_future.result()
+    
+    if stock_data_result[0] is None:
+        st.error("无法获取股票数据，请检查股票代码")
+        return False
+    stock_data, stock_metadata = stock_data_result
+    
+    # 获取股票信息
+    try:
+        stock_info = stock_info_future.result()
+    except Exception as e:
+        st.error(f"获取股票信息失败: {e}")
+        return False
+    
+    # 获取EPS数据
+    eps_result = eps_future.result()
+    
+    if eps_result[0] is None or eps_result[0] <= 0:
+        st.error("无法获取有效的EPS数据")
+        return False
+    eps_ttm, eps_metadata = eps_result
+    
+    # 获取前瞻EPS数据
+    forward_eps, forward_eps_metadata = forward_eps_future.result()
+    
+    # 存储到session state
+    st.session_state.price_data = stock_data
+    st.session_state.stock_info = stock_info
+    st.session_state.eps_ttm = eps_ttm
+    st.session_state.forward_eps = forward_eps
+    st.session_state.ticker = ticker
+    st.session_state.stock_metadata = stock_metadata
+    st.session_state.eps_metadata = eps_metadata
+    st.session_state.forward_eps_metadata = forward_eps_metadata
+    return True
+
+@st.fragment
+def render_valuation_section(calculator, pe_stats):
+    """估值参数调整、估值计算和结果展示"""
+    # 手动调整PE区间
+    st.subheader("⚙️ 估值计算")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        
+        
+        # 添加滚动PE区间调整说明 - 始终显示
+        st.markdown("#### 📝 自定义调整前瞻滚动PE区间")
+        
+        # 简洁显示数据来源提示
+        st.markdown("💡 **行业滚动PE参考:** [Seeking Alpha](https://seekingalpha.com) (推荐)")
+        
+        # 创建小型下拉框，仅在需要时展开详细说明
+        with st.expander("查看行业滚动PE获取方法", expanded=False):
+            # 添加行业PE获取说明
+            st.markdown("""
+            **Seeking Alpha 行业滚动PE查询方法：**
+            
+            - 获取路径： 
+              - 搜索股票代码 → 点击「Valuation」页签
+              - 点击「Grade & Metrics」页签
+              - 查看「P/E Non-GAAP (TTM)」指标
+            """)
+        
+        pe_lower_adj = st.number_input("滚动PE下限", value=pe_stats['pe_lower'], min_value=0.0, step=0.1)
+        pe_upper_adj = st.number_input("滚动PE上限", value=pe_stats['pe_upper'], min_value=0.0, step=0.1)
+        # 使用上限和下限的平均值作为中位数（上下限变化时默认值随之变化，输入框在本次运行中直接更新）
+        pe_median_default = (pe_lower_adj + pe_upper_adj) / 2
+        pe_median_adj = st.number_input("滚动PE中位值", value=pe_median_default, min_value=0.0, step=0.1, help="中位值默认为上限和下限的平均值")
+    
+    with col2:
+       
+        
+        # 添加EPS获取说明 - 始终显示
+        st.markdown("#### 📝 自定义调整EPS预测数据")
+        
+        # 简洁显示数据来源提示
+        st.markdown("💡 **数据来源:** [Seeking Alpha](https://seekingalpha.com) (推荐) | [Yahoo Finance](https://finance.yahoo.com) | 公司财报")
+        
+        # 创建小型下拉框，仅在需要时展开详细说明
+        with st.expander("查看详细获取方法", expanded=False):
+            # 添加数据获取说明
+            st.markdown("""
+           
+             **Seeking Alpha 前瞻EPS查询方法：** 
+               - 搜索股票代码 → Earnings → Earnings Estimates
+               - 查看"EPS Estimate"表格中的未来年份预测
+            
+            **注意：** 请确保使用最新的分析师一致预期数据，避免使用过时信息
+            """)
+        
+        # 前瞻EPS已随其他数据一起加载到session state
+        forward_eps = st.session_state.get('forward_eps')
+        
+        # 确保forward_eps是字典类型
+        if not isinstance(forward_eps, dict):
+            forward_eps = {}
+        
+        # 获取财年键列表
+        fiscal_years = sorted(forward_eps)  # 确保按年份排序
+        
+        # 使用实际财年信息作为标签
+        if len(fiscal_years) >= 1:
+            eps_fy_current = st.number_input("当前财年 EPS", 
+                                            key="eps_fy_current_input",
+                                            value=forward_eps.get(fiscal_years[0]) or 0.0, 
+                                            min_value=0.0, step=0.01, format="%.2f")
+        else:
+            eps_fy_current = st.number_input("当前财年 EPS", 
+                                           key="eps_fy_current_input",
+                                           value=0.0, min_value=0.0, step=0.01, format="%.2f")
+            
+        if len(fiscal_years) >= 2:
+            eps_fy_next = st.number_input("下一财年 EPS", 
+                                        key="eps_fy_next_input",
+                                        value=forward_eps.get(fiscal_years[1]) or 0.0, 
+                                        min_value=0.0, step=0.01, format="%.2f")
+        else:
+            eps_fy_next = st.number_input("下一财年 EPS", 
+                                        key="eps_fy_next_input",
+                                        value=0.0, min_value=0.0, step=0.01, format="%.2f")
+            
+        # 移除后年财年的输入框
+    
+    # 重新计算按钮
+    if st.button("🔄 计算估值", type="primary"):
+        # 更新PE区间
+        adjusted_pe_range = {
+            'pe_lower': pe_lower_adj,
+            'pe_upper': pe_upper_adj,
+            'pe_median': pe_median_adj
+        }
+        
+        # 更新前瞻EPS（沿用上面按年份排序的财年键列表）
+        adjusted_forward_eps = {}
+        
+        # 根据可用的财年键更新EPS值 - 只包含当前财年和下一财年
+        if len(fiscal_years) >= 1:
+            adjusted_forward_eps[fiscal_years[0]] = eps_fy_current
+        if len(fiscal_years) >= 2:
+            adjusted_forward_eps[fiscal_years[1]] = eps_fy_next
+        
+        # 计算估值（参数与上次相同时复用上次的结果，估值图表也随之复用）
+        valuation_results = memoize_in_session(
+            '_valuation_memo',
+            (*adjusted_forward_eps.keys(), *adjusted_forward_eps.values(), pe_lower_adj, pe_upper_adj, pe_median_adj),
+            lambda: calculator.calculate_valuation(adjusted_forward_eps, adjusted_pe_range)
+        )
+        
+        if valuation_results:
+            st.session_state.valuation_results = valuation_results
+            st.session_state.adjusted_pe_range = adjusted_pe_range
+            st.session_state.adjusted_forward_eps = adjusted_forward_eps
+    
+    # 显示估值结果
+    if 'valuation_results' in st.session_state:
+        st.subheader("🔮 前瞻估值分析")
+        
+        valuation_results = st.session_state.valuation_results
+        
+        # 估值表格
+        st.subheader("📋 估值详情")
+        
+        # 根据结果数量创建适当的标签
+        if len(valuation_results) == 1:
+            fiscal_labels = ["当前财年"]
+        elif len(valuation_results) == 2:
+            fiscal_labels = ["当前财年", "下一财年"]
+        else:
+            fiscal_labels = [f"财年{i+1}" for i in range(len(valuation_results))]
+        
+        # 按列构建DataFrame用于显示，使用新的财年标签
+        df_display = pd.DataFrame({
+            '财年': fiscal_labels,
+            '前瞻EPS': [result['eps'] for result in valuation_results],
+            '滚动PE区间': [result['pe_range'] for result in valuation_results],
+            '估值范围': [result['valuation_range'] for result in valuation_results],
+            'EPS来源': [result['source'] for result in valuation_results]
+        })
+        
+        st.dataframe(df_display, use_container_width=True)
+        
+        # 估值图表
+        valuation_chart = memoize_in_session(
+            '_valuation_chart_memo', (valuation_results,),
+            lambda: create_valuation_chart(valuation_results)
+        )
+        if valuation_chart:
+            st.plotly_chart(valuation_chart, use_container_width=True)
+        
+        # 估值总结模块已移除
+
+
 def main():
     # 在右上角显示API调用计数
     st.markdown(
@@ -537,10 +878,14 @@ def main():
     # 初始化计算器
     calculator = 滚动PECalculator()
     
-    # 自动清理过期缓存
-    cleaned = calculator.cache_manager.cleanup_cache()
-    if cleaned > 0:
-        st.sidebar.info(f"已自动清理 {cleaned} 个过期缓存文件")
+    # 自动清理过期缓存（需要扫描缓存目录，每个会话只在首次运行时执行）
+    if not st.session_state.get('_cache_cleaned'):
+        cleaned = calculator.cache_manager.cleanup_cache()
+        st.session_state._cache_cleaned = True
+        if cleaned > 0:
+            st.sidebar.info(f"已自动清理 {cleaned} 个过期缓存文件")
+    # 缓存管理器常驻进程，最后访问时间在每次运行时写回索引
+    calculator.cache_manager.flush_access_log()
     
     # 侧边栏设置
     st.sidebar.title("⚙️ 设置")
@@ -551,44 +896,38 @@ def main():
     
     # 缓存状态显示
     st.sidebar.subheader("💾 缓存状态")
-    if 'using_cached_data' in st.session_state and st.session_state.using_cached_data:
+    if st.session_state.get('using_cached_data'):
         st.sidebar.warning("🔄 当前使用缓存数据")
     else:
         st.sidebar.success("🌐 当前使用实时数据")
     
     # 如果有股票代码，显示该股票的缓存状态
-    if 'ticker' in st.session_state and st.session_state.ticker:
+    if st.session_state.get('ticker'):
         cache_status = calculator.cache_manager.get_cache_status_summary(st.session_state.ticker)
         if cache_status and 'data_status' in cache_status:
-            st.sidebar.write("**当前股票缓存状态:**")
             data_type_names = {
                 'stock_data': '股价数据',
                 'eps_ttm': 'EPS数据', 
                 'forward_eps': '前瞻EPS',
                 'stock_info': '股票信息'
             }
+            # 所有状态行合并为一个元素输出，避免每行单独发送到前端
+            status_lines = ["**当前股票缓存状态:**"]
+            now = datetime.now()
             for data_type, status in cache_status['data_status'].items():
                 display_name = data_type_names.get(data_type, data_type)
                 if status and status.get('update_time'):
-                    if status.get('is_expired', True):
-                        # 计算缓存天数
-                        try:
-                            from datetime import datetime
-                            update_time = datetime.strptime(status['update_time'], '%Y-%m-%d %H:%M:%S')
-                            days_old = (datetime.now() - update_time).days
-                            st.sidebar.write(f"📄 {display_name}: 已过期 ({days_old}天前)")
-                        except:
-                            st.sidebar.write(f"📄 {display_name}: 已过期")
+                    icon, label = ("📄", "已过期") if status.get('is_expired', True) else ("✅", "有效")
+                    # 计算缓存天数
+                    update_datetime = status.get('update_datetime')
+                    if update_datetime is not None:
+                        days_old = (now - update_datetime.replace(tzinfo=None)).days
+                        status_lines.append(f"{icon} {display_name}: {label} ({days_old}天前)")
                     else:
-                        try:
-                            from datetime import datetime
-                            update_time = datetime.strptime(status['update_time'], '%Y-%m-%d %H:%M:%S')
-                            days_old = (datetime.now() - update_time).days
-                            st.sidebar.write(f"✅ {display_name}: 有效 ({days_old}天前)")
-                        except:
-                            st.sidebar.write(f"✅ {display_name}: 有效")
+                        status_lines.append(f"{icon} {display_name}: {label}")
                 else:
-                    st.sidebar.write(f"❌ {display_name}: 无缓存")
+                    status_lines.append(f"❌ {display_name}: 无缓存")
+            st.sidebar.markdown("\n\n".join(status_lines))
     
     # 检查session_state中是否已有股票代码
     if 'current_ticker' not in st.session_state:
@@ -602,22 +941,10 @@ def main():
     if ticker != st.session_state.current_ticker:
         ticker_changed = True
         st.session_state.current_ticker = ticker
-        # 清除之前的数据
-        if 'price_data' in st.session_state:
-            del st.session_state.price_data
-        if 'stock_info' in st.session_state:
-            del st.session_state.stock_info
-        if 'eps_ttm' in st.session_state:
-            del st.session_state.eps_ttm
-        if 'forward_eps' in st.session_state:
-            del st.session_state.forward_eps
-        if 'valuation_results' in st.session_state:
-            del st.session_state.valuation_results
-        # 清除EPS输入数据
-        if 'eps_fy_current_input' in st.session_state:
-            del st.session_state.eps_fy_current_input
-        if 'eps_fy_next_input' in st.session_state:
-            del st.session_state.eps_fy_next_input
+        # 清除之前的数据和EPS输入数据
+        for key in ('price_data', 'stock_info', 'eps_ttm', 'forward_eps', 'valuation_results',
+                    'eps_fy_current_input', 'eps_fy_next_input'):
+            st.session_state.pop(key, None)
         # 自动获取新数据
         st.rerun()
     
@@ -650,109 +977,26 @@ def main():
     st.sidebar.subheader("📊 API调用状态")
     
     # 显示当前API调用状态
-    st.sidebar.write(f"API状态: 🟢 正常")
+    if get_rate_limiter().available_tokens >= 1:
+        st.sidebar.write(f"API状态: 🟢 正常")
+    else:
+        st.sidebar.write(f"API状态: 🔴 限流中")
     st.sidebar.write(f"今日调用次数: {st.session_state.api_call_count}")
     
     # 获取数据按钮
     if st.sidebar.button("🔄 获取数据", type="primary"):
         st.session_state.using_cached_data = False  # 重置缓存使用状态
         with st.spinner(""):
-            # 获取股票数据
-            stock_data_result = calculator.get_stock_data(ticker.upper(), force_refresh=force_refresh)
-            
-            if stock_data_result[0] is None:
-                st.error("无法获取股票数据，请检查股票代码")
-                return
-            stock_data, stock_metadata = stock_data_result
-            
-            # 获取股票信息
-            try:
-                # 检查缓存中是否有股票信息
-                cached_info = calculator.cache_manager.load_cache(ticker.upper(), 'stock_info')
-                if cached_info and not force_refresh:
-                    stock_info = cached_info[0]
-                else:
-                    # 获取股票信息
-                        
-                    stock = yf.Ticker(ticker.upper())
-                    increment_api_call_count()  # 增加API调用计数
-                    stock_info = stock.info
-                    # 保存到缓存
-                    calculator.cache_manager.save_cache(ticker.upper(), 'stock_info', stock_info)
-                st.session_state.stock_info = stock_info
-            except Exception as e:
-                st.error(f"获取股票信息失败: {e}")
-                return
-            
-            # 获取EPS数据
-            eps_result = calculator.get_eps_ttm(ticker.upper(), force_refresh=force_refresh)
-            
-            if eps_result[0] is None or eps_result[0] <= 0:
-                st.error("无法获取有效的EPS数据")
+            if not load_ticker_data(calculator, ticker, force_refresh):
                 return
-            eps_ttm, eps_metadata = eps_result
-            
-            # 存储到session state
-            st.session_state.price_data = stock_data
-            st.session_state.stock_info = stock_info
-            st.session_state.eps_ttm = eps_ttm
-            st.session_state.ticker = ticker.upper()
-            st.session_state.stock_metadata = stock_metadata
-            st.session_state.eps_metadata = eps_metadata
     
     # 检查是否有数据
     if 'price_data' not in st.session_state:
         # 自动获取数据
         st.session_state.using_cached_data = False  # 重置缓存使用状态
         with st.spinner("正在获取数据..."):
-            # 获取股票数据
-            stock_data_result = calculator.get_stock_data(ticker.upper(), force_refresh=force_refresh)
-            
-            if stock_data_result[0] is None:
-                st.error("无法获取股票数据，请检查股票代码")
-                return
-            stock_data, stock_metadata = stock_data_result
-            
-            # 获取股票信息
-            try:
-                # 检查缓存中是否有股票信息
-                cached_info = calculator.cache_manager.load_cache(ticker.upper(), 'stock_info')
-                if cached_info and not force_refresh:
-                    stock_info = cached_info[0]
-                else:
-                    # 获取股票信息
-                        
-                    stock = yf.Ticker(ticker.upper())
-                    increment_api_call_count()  # 增加API调用计数
-                    stock_info = stock.info
-                    # 保存到缓存
-                    calculator.cache_manager.save_cache(ticker.upper(), 'stock_info', stock_info)
-                st.session_state.stock_info = stock_info
-            except Exception as e:
-                st.error(f"获取股票信息失败: {e}")
+            if not load_ticker_data(calculator, ticker, force_refresh):
                 return
-            
-            # 获取EPS数据
-            eps_result = calculator.get_eps_ttm(ticker.upper(), force_refresh=force_refresh)
-            
-            if eps_result[0] is None or eps_result[0] <= 0:
-                st.error("无法获取有效的EPS数据")
-                return
-            eps_ttm, eps_metadata = eps_result
-            
-            # 获取前瞻EPS数据
-            forward_eps_result = calculator.get_forward_eps_estimates(ticker, force_refresh=force_refresh)
-            forward_eps, forward_eps_metadata = forward_eps_result
-            
-            # 存储到session state
-            st.session_state.price_data = stock_data
-            st.session_state.stock_info = stock_info
-            st.session_state.eps_ttm = eps_ttm
-            st.session_state.forward_eps = forward_eps
-            st.session_state.ticker = ticker.upper()
-            st.session_state.stock_metadata = stock_metadata
-            st.session_state.eps_metadata = eps_metadata
-            st.session_state.forward_eps_metadata = forward_eps_metadata
     
     price_data = st.session_state.price_data
     stock_info = st.session_state.stock_info
@@ -771,7 +1015,7 @@ def main():
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        current_price = price_data['Close'].iloc[-1]
+        current_price = float(price_data['Close'].iat[-1])  # iat是最快的标量访问方式
         st.metric("当前股价", f"${current_price:.2f}")
     
     with col2:
@@ -782,17 +1026,13 @@ def main():
         st.metric("当前滚动PE", f"{current_pe:.2f}")
     
     with col4:
-        market_cap = stock_info.get('marketCap', 0)
-        if market_cap > 1e12:
-            cap_str = f"${market_cap/1e12:.2f}T"
-        elif market_cap > 1e9:
-            cap_str = f"${market_cap/1e9:.2f}B"
-        else:
-            cap_str = f"${market_cap/1e6:.2f}M"
-        st.metric("市值", cap_str)
+        st.metric("市值", format_market_cap(stock_info.get('marketCap') or 0))
     
     # 计算滚动PE区间
-    pe_stats = calculator.calculate_pe_range(price_data, eps_ttm)
+    pe_stats = memoize_in_session(
+        '_pe_stats_memo', (price_data, eps_ttm),
+        lambda: calculator.calculate_pe_range(price_data, eps_ttm)
+    )
     
     if pe_stats is None:
         st.error("无法计算滚动PE区间")
@@ -801,22 +1041,15 @@ def main():
     # 滚动PE统计信息
     # 检查是否使用了缓存数据并添加提示
     cache_warning = ""
-    if ('using_cached_data' in st.session_state and st.session_state.using_cached_data) or \
-       (st.session_state.get('stock_metadata') and st.session_state.stock_metadata.get('is_expired')) or \
-       (st.session_state.get('eps_metadata') and st.session_state.eps_metadata.get('is_expired')):
-        # 获取最旧的数据时间作为提示
-        oldest_date = None
-        if st.session_state.get('stock_metadata') and st.session_state.stock_metadata.get('last_updated'):
-            oldest_date = st.session_state.stock_metadata['last_updated']
-        if st.session_state.get('eps_metadata') and st.session_state.eps_metadata.get('last_updated'):
-            eps_date = st.session_state.eps_metadata['last_updated']
-            if oldest_date is None or eps_date < oldest_date:
-                oldest_date = eps_date
-        
-        if oldest_date:
-            from datetime import datetime
-            if isinstance(oldest_date, str):
-                oldest_date = datetime.fromisoformat(oldest_date.replace('Z', '+00:00'))
+    stock_metadata = st.session_state.get('stock_metadata') or {}
+    eps_metadata = st.session_state.get('eps_metadata') or {}
+    if st.session_state.get('using_cached_data') or \
+       stock_metadata.get('is_expired') or eps_metadata.get('is_expired'):
+        # 获取最旧的数据时间作为提示（缓存元数据中的created_at为ISO格式字符串，可直接比较先后）
+        cached_dates = [date_str for date_str in (stock_metadata.get('created_at'), eps_metadata.get('created_at'))
+                        if date_str]
+        if cached_dates:
+            oldest_date = datetime.fromisoformat(min(cached_dates))
             days_old = (datetime.now(oldest_date.tzinfo) - oldest_date).days
             cache_warning = f" ⚠️ (使用{days_old}天前的缓存数据)"
     
@@ -826,197 +1059,28 @@ def main():
     
     with col1:
         # 滚动PE趋势图
-        pe_chart = create_pe_trend_chart(price_data, eps_ttm, cache_warning)
+        pe_chart = memoize_in_session(
+            '_pe_chart_memo', (pe_stats, cache_warning),
+            lambda: create_pe_trend_chart(pe_stats, cache_warning)
+        )
         if pe_chart:
             st.plotly_chart(pe_chart, use_container_width=True)
     
     with col2:
-        st.markdown("**滚动PE统计指标**")
-        st.write(f"均值: {pe_stats['pe_mean']}")
-        st.write(f"中位数: {pe_stats['pe_median']}")
-        st.write(f"标准差: {pe_stats['pe_std']}")
-        st.write(f"区间: {pe_stats['pe_lower']} – {pe_stats['pe_upper']}")
-        st.write(f"最小值: {pe_stats['pe_min']}")
-        st.write(f"最大值: {pe_stats['pe_max']}")
-        st.write(f"数据点: {pe_stats['data_points']}")
-    
-    # 手动调整PE区间
-    st.subheader("⚙️ 估值计算")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        
-        
-        # 添加滚动PE区间调整说明 - 始终显示
-        st.markdown("#### 📝 自定义调整前瞻滚动PE区间")
-        
-        # 简洁显示数据来源提示
-        st.markdown("💡 **行业滚动PE参考:** [Seeking Alpha](https://seekingalpha.com) (推荐)")
-        
-        # 创建小型下拉框，仅在需要时展开详细说明
-        with st.expander("查看行业滚动PE获取方法", expanded=False):
-            # 添加行业PE获取说明
-            st.markdown("""
-            **Seeking Alpha 行业滚动PE查询方法：**
-            
-            - 获取路径： 
-              - 搜索股票代码 → 点击「Valuation」页签
-              - 点击「Grade & Metrics」页签
-              - 查看「P/E Non-GAAP (TTM)」指标
-            """)
-        
-        pe_lower_adj = st.number_input("滚动PE下限", value=float(pe_stats['pe_lower']), min_value=0.0, step=0.1)
-        pe_upper_adj = st.number_input("滚动PE上限", value=float(pe_stats['pe_upper']), min_value=0.0, step=0.1)
-        # 使用上限和下限的平均值作为中位数
-        pe_median_default = (pe_lower_adj + pe_upper_adj) / 2
-        pe_median_adj = st.number_input("滚动PE中位值", value=float(pe_median_default), min_value=0.0, step=0.1, help="中位值默认为上限和下限的平均值")
-        
-        # 当PE上限或下限变化时，自动更新中位数
-        if 'last_pe_lower' not in st.session_state or 'last_pe_upper' not in st.session_state:
-            st.session_state.last_pe_lower = pe_lower_adj
-            st.session_state.last_pe_upper = pe_upper_adj
-        elif st.session_state.last_pe_lower != pe_lower_adj or st.session_state.last_pe_upper != pe_upper_adj:
-            st.session_state.last_pe_lower = pe_lower_adj
-            st.session_state.last_pe_upper = pe_upper_adj
-            # 更新中位数并重新加载页面
-            st.rerun()
-    
-    with col2:
-       
-        
-        # 添加EPS获取说明 - 始终显示
-        st.markdown("#### 📝 自定义调整EPS预测数据")
-        
-        # 简洁显示数据来源提示
-        st.markdown("💡 **数据来源:** [Seeking Alpha](https://seekingalpha.com) (推荐) | [Yahoo Finance](https://finance.yahoo.com) | 公司财报")
-        
-        # 创建小型下拉框，仅在需要时展开详细说明
-        with st.expander("查看详细获取方法", expanded=False):
-            # 添加数据获取说明
-            st.markdown("""
-           
-             **Seeking Alpha 前瞻EPS查询方法：** 
-               - 搜索股票代码 → Earnings → Earnings Estimates
-               - 查看"EPS Estimate"表格中的未来年份预测
-            
-            **注意：** 请确保使用最新的分析师一致预期数据，避免使用过时信息
-            """)
-        
-        # 检查是否需要获取前瞻EPS数据
-        if 'forward_eps' not in st.session_state or force_refresh:
-            forward_eps_result = calculator.get_forward_eps_estimates(ticker, force_refresh=force_refresh)
-            if isinstance(forward_eps_result, tuple):
-                forward_eps, metadata = forward_eps_result
-            else:
-                forward_eps = forward_eps_result
-            st.session_state.forward_eps = forward_eps
-        else:
-            forward_eps = st.session_state.forward_eps
-        
-        # 确保forward_eps是字典类型
-        if not isinstance(forward_eps, dict):
-            forward_eps = {}
-        
-        # 获取财年键列表
-        fiscal_years = list(forward_eps.keys())
-        fiscal_years.sort()  # 确保按年份排序
-        
-        # 使用实际财年信息作为标签
-        if len(fiscal_years) >= 1:
-            eps_fy_current = st.number_input("当前财年 EPS", 
-                                            key="eps_fy_current_input",
-                                            value=forward_eps.get(fiscal_years[0]) or 0.0, 
-                                            min_value=0.0, step=0.01, format="%.2f")
-        else:
-            eps_fy_current = st.number_input("当前财年 EPS", 
-                                           key="eps_fy_current_input",
-                                           value=0.0, min_value=0.0, step=0.01, format="%.2f")
-            
-        if len(fiscal_years) >= 2:
-            eps_fy_next = st.number_input("下一财年 EPS", 
-                                        key="eps_fy_next_input",
-                                        value=forward_eps.get(fiscal_years[1]) or 0.0, 
-                                        min_value=0.0, step=0.01, format="%.2f")
-        else:
-            eps_fy_next = st.number_input("下一财年 EPS", 
-                                        key="eps_fy_next_input",
-                                        value=0.0, min_value=0.0, step=0.01, format="%.2f")
-            
-        # 移除后年财年的输入框
-    
-    # 重新计算按钮
-    if st.button("🔄 计算估值", type="primary"):
-        # 更新PE区间
-        adjusted_pe_range = {
-            'pe_lower': pe_lower_adj,
-            'pe_upper': pe_upper_adj,
-            'pe_median': pe_median_adj
-        }
-        
-        # 获取财年键列表
-        fiscal_years = list(forward_eps.keys())
-        fiscal_years.sort()  # 确保按年份排序
-        
-        # 更新前瞻EPS
-        adjusted_forward_eps = {}
-        
-        # 根据可用的财年键更新EPS值 - 只包含当前财年和下一财年
-        if len(fiscal_years) >= 1:
-            adjusted_forward_eps[fiscal_years[0]] = eps_fy_current
-        if len(fiscal_years) >= 2:
-            adjusted_forward_eps[fiscal_years[1]] = eps_fy_next
-        
-        # 计算估值
-        valuation_results = calculator.calculate_valuation(adjusted_forward_eps, adjusted_pe_range)
-        
-        if valuation_results:
-            st.session_state.valuation_results = valuation_results
-            st.session_state.adjusted_pe_range = adjusted_pe_range
-            st.session_state.adjusted_forward_eps = adjusted_forward_eps
-    
-    # 显示估值结果
-    if 'valuation_results' in st.session_state:
-        st.subheader("🔮 前瞻估值分析")
-        
-        valuation_results = st.session_state.valuation_results
-        
-        # 估值表格
-        st.subheader("📋 估值详情")
-        
-        # 创建DataFrame用于显示
-        df_display = pd.DataFrame([]
-        )
-        
-        # 根据结果数量创建适当的标签
-        if len(valuation_results) == 1:
-            fiscal_labels = ["当前财年"]
-        elif len(valuation_results) == 2:
-            fiscal_labels = ["当前财年", "下一财年"]
-        else:
-            fiscal_labels = [f"财年{i+1}" for i in range(len(valuation_results))]
-        
-        # 创建DataFrame用于显示，使用新的财年标签
-        df_display = pd.DataFrame([
-            {
-                '财年': fiscal_labels[i],
-                '前瞻EPS': result['eps'],
-                '滚动PE区间': result['pe_range'],
-                '估值范围': result['valuation_range'],
-                'EPS来源': result['source']
-            }
-            for i, result in enumerate(valuation_results)
-        ])
-        
-        st.dataframe(df_display, use_container_width=True)
-        
-        # 估值图表
-        valuation_chart = create_valuation_chart(valuation_results)
-        if valuation_chart:
-            st.plotly_chart(valuation_chart, use_container_width=True)
-        
-        # 估值总结模块已移除
-        
+        # 统计指标合并为一个元素输出，避免每行单独发送到前端
+        st.markdown("\n\n".join([
+            "**滚动PE统计指标**",
+            f"均值: {pe_stats['pe_mean']}",
+            f"中位数: {pe_stats['pe_median']}",
+            f"标准差: {pe_stats['pe_std']}",
+            f"区间: {pe_stats['pe_lower']} – {pe_stats['pe_upper']}",
+            f"最小值: {pe_stats['pe_min']}",
+            f"最大值: {pe_stats['pe_max']}",
+            f"数据点: {pe_stats['data_points']}"
+        ]))
+    
+    # 估值计算部分作为局部片段运行：调整参数只重新运行这一部分，不重新发送上方的图表
+    render_valuation_section(calculator, pe_stats)
 
 
 if __name__ == "__main__":
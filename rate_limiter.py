@@ -0,0 +1,73 @@
+import threading
+import time
+from typing import Optional
+
+
+class RateLimitExceeded(Exception):
+    """本地限流：需要等待的时间超过允许的上限"""
+
+
+class TokenBucket:
+    """令牌桶限流器，平滑对Yahoo Finance的请求速率
+
+    每次API请求消耗一个令牌，令牌按固定速率补充；桶空时等待下一个令牌，
+    等待时间超过max_wait（默认为补充一个令牌所需的时间，即只允许等待下一个令牌，
+    不允许多个请求排队）则抛出RateLimitExceeded，由调用方回退到缓存数据。
+    收到服务端限流(429)后，在一段时间内将补充速率减半。
+    """
+
+    def __init__(self, capacity: int = 50, refill_rate: float = 50 / 3600,
+                 max_wait: Optional[float] = None, penalty_duration: float = 300.0):
+        self.capacity = capacity
+        self.base_refill_rate = refill_rate      # 令牌/秒
+        self.max_wait = max_wait                 # 单次请求最多等待的秒数，None表示按当前补充速率等待一个令牌
+        self.penalty_duration = penalty_duration # 被限流后降速持续的秒数
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._penalty_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill_rate(self, now: float) -> float:
+        """当前补充速率（被限流后的降速期内减半）"""
+        if now < self._penalty_until:
+            return self.base_refill_rate / 2
+        return self.base_refill_rate
+
+    def _refill(self, now: float) -> None:
+        """按经过的时间补充令牌（调用方需持有锁）"""
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self._refill_rate(now))
+            self._updated = now
+
+    def acquire(self) -> None:
+        """获取一个令牌，必要时等待；等待时间超过max_wait时抛出RateLimitExceeded"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            refill_rate = self._refill_rate(now)
+            wait = (1 - self._tokens) / refill_rate
+            max_wait = self.max_wait if self.max_wait is not None else 1 / refill_rate
+            if wait > max_wait:
+                raise RateLimitExceeded(f"API调用过于频繁，请在{wait:.0f}秒后重试")
+            # 预先扣除令牌，并发的请求依次排在后面等待
+            self._tokens -= 1
+        time.sleep(wait)
+
+    def penalize(self) -> None:
+        """服务端返回限流时调用：清空令牌并在一段时间内降低补充速率"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            self._penalty_until = now + self.penalty_duration
+
+    @property
+    def available_tokens(self) -> float:
+        """当前可用令牌数"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens